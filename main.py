@@ -5,10 +5,20 @@ import sqlite3
 import subprocess
 import fnmatch
 import os
-from typing import Optional, Set
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
 from pathlib import Path
 from mcp.server.fastmcp import FastMCP
 
+try:
+    from orjson import loads as _jloads
+except ImportError:
+    from json import loads as _jloads
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -19,47 +29,97 @@ logger = logging.getLogger(__name__)
 
 SERVER = FastMCP("api-lookup")
 DB_PATH = "ctags_index.db"
+HASH_CHUNK_SIZE = 1 << 20
+HASH_WORKERS = 8
+# Each worker's staging database is attached to the main connection, so stay
+# below SQLite's default limit of 10 attached databases.
+STAGING_WORKERS = 8
+INSERT_CTAG_SQL = """
+    INSERT INTO ctags (api_file, raw_json, path, kind, line)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+SEARCH_CACHE_SIZE = 1024
+
+SERVER_CONN_LOCK = threading.Lock()
+_server_conn = None
 
+_staging_conn = None
 
-def get_db_connection(db_path=None):
+
+def get_db_connection(db_path=None, check_same_thread=True):
     """Get a database connection. Use provided path or default."""
     path = db_path or DB_PATH
-    return sqlite3.connect(path)
+    conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+def get_server_connection():
+    """Get the shared connection used by the MCP tools, opening it on first use.
+
+    Callers must hold SERVER_CONN_LOCK while using the connection.
+    """
+    global _server_conn
+    if _server_conn is None:
+        _server_conn = get_db_connection(check_same_thread=False)
+    return _server_conn
+
+
+def close_server_connection():
+    """Close the shared MCP tool connection so the next use reopens it."""
+    global _server_conn
+    with SERVER_CONN_LOCK:
+        if _server_conn is not None:
+            _server_conn.close()
+            _server_conn = None
+        # Cached searches are keyed on this connection's data_version.
+        _search_declarations.cache_clear()
 
 
 def calculate_file_hash(file_path: Path) -> str:
     """Calculate SHA-256 hash of a file."""
-    hash_sha256 = hashlib.sha256()
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+        hash_sha256 = hashlib.sha256()
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
             hash_sha256.update(chunk)
-    return hash_sha256.hexdigest()
+        return hash_sha256.hexdigest()
 
 
-def get_stored_file_hash(api_name: str, db_path=None) -> Optional[str]:
-    """Get the stored hash for an API file."""
+def get_stored_file_states(db_path=None) -> Dict[str, Tuple[str, Optional[int], Optional[int]]]:
+    """Get the stored hash, mtime and size for all indexed API files."""
     with get_db_connection(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            "SELECT file_hash FROM indexed_apis WHERE api_name = ?", (api_name,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+            "SELECT api_name, file_hash, file_mtime, file_size FROM indexed_apis")
+        return {row[0]: row[1:] for row in cursor.fetchall()}
 
 
-def update_file_hash(api_name: str, file_hash: str, db_path=None, conn=None):
-    """Update the stored hash for an API file."""
+def update_file_hash(api_name: str, file_hash: str, db_path=None, conn=None,
+                     file_mtime: Optional[int] = None, file_size: Optional[int] = None):
+    """Update the stored hash (and optionally mtime and size) for an API file."""
     if conn is None:
         with get_db_connection(db_path) as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT OR REPLACE INTO indexed_apis (api_name, file_hash) VALUES (?, ?)
-            """, (api_name, file_hash))
+                INSERT OR REPLACE INTO indexed_apis (api_name, file_hash, file_mtime, file_size)
+                VALUES (?, ?, ?, ?)
+            """, (api_name, file_hash, file_mtime, file_size))
             conn.commit()
     else:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT OR REPLACE INTO indexed_apis (api_name, file_hash) VALUES (?, ?)
-        """, (api_name, file_hash))
+            INSERT OR REPLACE INTO indexed_apis (api_name, file_hash, file_mtime, file_size)
+            VALUES (?, ?, ?, ?)
+        """, (api_name, file_hash, file_mtime, file_size))
 
 
 def check_fts5_support() -> bool:
@@ -75,8 +135,69 @@ def check_fts5_support() -> bool:
         return False
 
 
+def create_fts_triggers(cursor):
+    """Create the triggers that keep ctags_fts in sync with ctags."""
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS ctags_ai AFTER INSERT ON ctags BEGIN
+            INSERT INTO ctags_fts(rowid, raw_json)
+            VALUES (new.id, new.raw_json);
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS ctags_ad AFTER DELETE ON ctags BEGIN
+            INSERT INTO ctags_fts(ctags_fts, rowid, raw_json)
+            VALUES('delete', old.id, old.raw_json);
+        END
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS ctags_au AFTER UPDATE ON ctags BEGIN
+            INSERT INTO ctags_fts(ctags_fts, rowid, raw_json)
+            VALUES('delete', old.id, old.raw_json);
+            INSERT INTO ctags_fts(rowid, raw_json)
+            VALUES (new.id, new.raw_json);
+        END
+    """)
+
+
+def drop_fts_triggers(cursor):
+    """Drop the ctags_fts sync triggers, e.g. before a bulk load."""
+    cursor.execute("DROP TRIGGER IF EXISTS ctags_ai")
+    cursor.execute("DROP TRIGGER IF EXISTS ctags_ad")
+    cursor.execute("DROP TRIGGER IF EXISTS ctags_au")
+
+
+def delete_api_fts(cursor, api_name: str):
+    """Remove an API's entries from ctags_fts while the sync triggers are dropped.
+
+    Must run before the API's rows are deleted from ctags.
+    """
+    cursor.execute("""
+        INSERT INTO ctags_fts(ctags_fts, rowid, raw_json)
+        SELECT 'delete', id, raw_json FROM ctags WHERE api_file = ?
+    """, (api_name,))
+
+
+def insert_api_fts(cursor, api_name: str):
+    """Add an API's ctags rows to ctags_fts while the sync triggers are dropped."""
+    cursor.execute("""
+        INSERT INTO ctags_fts(rowid, raw_json)
+        SELECT id, raw_json FROM ctags WHERE api_file = ?
+    """, (api_name,))
+
+
+def rebuild_fts_index(cursor):
+    """Rebuild ctags_fts from ctags and restore the sync triggers after a bulk load."""
+    cursor.execute("INSERT INTO ctags_fts(ctags_fts) VALUES('rebuild')")
+    create_fts_triggers(cursor)
+
+
 def init_database(db_path=None):
     """Initialize the SQLite database with simplified ctags schema."""
+    if db_path is None:
+        close_server_connection()
+
     with get_db_connection(db_path) as conn:
         cursor = conn.cursor()
 
@@ -85,23 +206,63 @@ def init_database(db_path=None):
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 api_file TEXT NOT NULL,
                 raw_json TEXT NOT NULL,
+                path TEXT,
+                kind TEXT,
+                line INTEGER,
                 indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
 
+        # Databases created before path/kind/line were stored as columns
+        # lack them; add and backfill them from raw_json.
+        cursor.execute("PRAGMA table_info(ctags)")
+        columns = {row[1] for row in cursor.fetchall()}
+        missing = [(column, column_type) for column, column_type in
+                   (("path", "TEXT"), ("kind", "TEXT"), ("line", "INTEGER"))
+                   if column not in columns]
+        for column, column_type in missing:
+            cursor.execute(
+                f"ALTER TABLE ctags ADD COLUMN {column} {column_type}")
+        if missing:
+            # raw_json is unchanged, so keep the update trigger from
+            # rewriting ctags_fts; the triggers are recreated below.
+            drop_fts_triggers(cursor)
+            cursor.execute("""
+                UPDATE ctags SET
+                    path = json_extract(raw_json, '$.path'),
+                    kind = json_extract(raw_json, '$.kind'),
+                    line = json_extract(raw_json, '$.line')
+            """)
+        cursor.execute("DROP INDEX IF EXISTS idx_path_kind_line")
+
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_api_file ON ctags(api_file)
         """)
 
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ctags_path_kind_line
+            ON ctags(path, kind, line)
+        """)
+
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS indexed_apis (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 api_name TEXT UNIQUE NOT NULL,
                 file_hash TEXT,
+                file_mtime INTEGER,
+                file_size INTEGER,
                 indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
 
+        # Databases created before mtime/size tracking lack these columns.
+        cursor.execute("PRAGMA table_info(indexed_apis)")
+        columns = {row[1] for row in cursor.fetchall()}
+        for column in ("file_mtime", "file_size"):
+            if column not in columns:
+                cursor.execute(
+                    f"ALTER TABLE indexed_apis ADD COLUMN {column} INTEGER")
+
         cursor.execute("""
             CREATE VIRTUAL TABLE IF NOT EXISTS ctags_fts USING fts5(
                 raw_json,
@@ -110,81 +271,240 @@ def init_database(db_path=None):
             )
         """)
 
-        cursor.execute("""
-            CREATE TRIGGER IF NOT EXISTS ctags_ai AFTER INSERT ON ctags BEGIN
-                INSERT INTO ctags_fts(rowid, raw_json)
-                VALUES (new.id, new.raw_json);
-            END
-        """)
-
-        cursor.execute("""
-            CREATE TRIGGER IF NOT EXISTS ctags_ad AFTER DELETE ON ctags BEGIN
-                INSERT INTO ctags_fts(ctags_fts, rowid, raw_json)
-                VALUES('delete', old.id, old.raw_json);
-            END
-        """)
-
-        cursor.execute("""
-            CREATE TRIGGER IF NOT EXISTS ctags_au AFTER UPDATE ON ctags BEGIN
-                INSERT INTO ctags_fts(ctags_fts, rowid, raw_json)
-                VALUES('delete', old.id, old.raw_json);
-                INSERT INTO ctags_fts(rowid, raw_json)
-                VALUES (new.id, new.raw_json);
-            END
-        """)
+        create_fts_triggers(cursor)
 
         conn.commit()
 
 
-def clear_api_from_db(api_name: str, db_path=None):
+def clear_api_from_db(api_name: str, db_path=None, conn=None):
     """Remove all entries for a specific API from the database."""
-    with get_db_connection(db_path) as conn:
-        cursor = conn.cursor()
+    if conn is None:
+        with get_db_connection(db_path) as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("DELETE FROM ctags WHERE api_file = ?", (api_name,))
+            cursor.execute(
+                "DELETE FROM indexed_apis WHERE api_name = ?", (api_name,))
 
+            conn.commit()
+    else:
+        cursor = conn.cursor()
         cursor.execute("DELETE FROM ctags WHERE api_file = ?", (api_name,))
         cursor.execute(
             "DELETE FROM indexed_apis WHERE api_name = ?", (api_name,))
 
-        conn.commit()
 
+def iter_api_rows(lines, api_name: str, counts: Dict[str, int]):
+    """Yield (api_file, raw_json, path, kind, line) rows for the tag entries
+    among ctags JSON lines.
 
-def index_api_file(path: Path, db_path=None):
-    logger.info(f"Starting to index API file: {path}")
+    The number of non-empty lines read and tag entries yielded are stored in
+    counts under "lines" and "tags" once the lines are exhausted.
+    """
     line_count = 0
     processed_count = 0
+
+    try:
+        for line in lines:
+            line = line.strip()
+            if line:
+                line_count += 1
+                try:
+                    entry = _jloads(line)
+                    if entry.get("_type") != "tag":
+                        continue
+
+                    processed_count += 1
+                    yield (api_name, line.decode("utf-8"), entry.get("path"),
+                           entry.get("kind"), entry.get("line"))
+
+                except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                    logger.warning(
+                        f"Failed to parse JSON line {line_count}: {e}")
+                    continue
+    finally:
+        counts["lines"] = line_count
+        counts["tags"] = processed_count
+
+
+def load_api_rows(cursor, path: Path, api_name: str):
+    """Insert the tag entries of a ctags JSON file through the given cursor."""
+    counts = {}
+
+    with open(path, "rb") as f:
+        cursor.executemany(INSERT_CTAG_SQL, iter_api_rows(f, api_name, counts))
+
+    return counts["lines"], counts["tags"]
+
+
+def replace_api_rows(conn, api_name: str, load_rows, file_hash: str,
+                     file_stat: os.stat_result, bulk=False, db_path=None):
+    """Replace the entries of an API with the rows inserted by load_rows.
+
+    load_rows is called with a cursor and must insert the API's new rows into
+    ctags; its return value is passed through. The caller owns the
+    transaction and must call drop_fts_triggers before replacing and
+    create_fts_triggers after it. With bulk, ctags_fts is left untouched and
+    the caller calls rebuild_fts_index instead.
+    """
+    cursor = conn.cursor()
+    if not bulk:
+        delete_api_fts(cursor, api_name)
+    clear_api_from_db(api_name, db_path, conn)
+
+    result = load_rows(cursor)
+    if not bulk:
+        insert_api_fts(cursor, api_name)
+
+    update_file_hash(api_name, file_hash, db_path, conn,
+                     file_stat.st_mtime_ns, file_stat.st_size)
+    return result
+
+
+def index_api_file(path: Path, db_path=None, conn=None, bulk=False,
+                   file_hash: Optional[str] = None, file_stat: Optional[os.stat_result] = None):
+    """Index a ctags JSON file, replacing any previous entries for its API.
+
+    Without conn the file is indexed in its own transaction. With conn the
+    caller owns the transaction, as described for replace_api_rows.
+
+    file_hash and file_stat may be passed together when the caller has
+    already hashed the file, so it is not read twice.
+    """
+    if conn is None:
+        with get_db_connection(db_path) as conn:
+            cursor = conn.cursor()
+
+            # Load without the per-row FTS triggers and update the
+            # full-text index with set-based statements instead.
+            cursor.execute("BEGIN IMMEDIATE")
+            drop_fts_triggers(cursor)
+            index_api_file(path, db_path, conn, bulk=False,
+                           file_hash=file_hash, file_stat=file_stat)
+            create_fts_triggers(cursor)
+
+            conn.commit()
+        return
+
+    logger.info(f"Starting to index API file: {path}")
     api_name = path.stem
+    if file_hash is None or file_stat is None:
+        # Stat before reading so a concurrent write shows up as a change later.
+        file_stat = path.stat()
+        file_hash = calculate_file_hash(path)
 
-    clear_api_from_db(api_name, db_path)
+    line_count, processed_count = replace_api_rows(
+        conn, api_name, lambda cursor: load_api_rows(cursor, path, api_name),
+        file_hash, file_stat, bulk=bulk, db_path=db_path)
 
-    with get_db_connection(db_path) as conn:
-        cursor = conn.cursor()
+    logger.info(
+        f"Indexing complete for {path}. Processed {processed_count} tag entries out of {line_count} total entries")
 
-        with open(path, "r") as f:
-            for line in f:
-                if line.strip():
-                    line_count += 1
-                    try:
-                        ctag_entry = json.loads(line)
 
-                        if ctag_entry.get("_type") != "tag":
-                            continue
+def init_staging_worker(staging_dir: str):
+    """Open the private staging database of a staging worker process.
 
-                        processed_count += 1
-                        raw_json = line.strip()
+    The database is thrown away after the indexing run, so it is written
+    without a journal and without syncing.
+    """
+    global _staging_conn
+    _staging_conn = sqlite3.connect(Path(staging_dir) / f"{os.getpid()}.db")
+    cursor = _staging_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=OFF")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("""
+        CREATE TABLE ctags (
+            api_file TEXT NOT NULL,
+            raw_json TEXT NOT NULL,
+            path TEXT,
+            kind TEXT,
+            line INTEGER
+        )
+    """)
+
+
+def stage_api_file(path: Path):
+    """Parse an API file into the staging database of the worker process.
+
+    Returns the staging database path, the rowid range (first_id, last_id]
+    holding the file's rows, and the number of lines read and tag entries
+    staged.
+    """
+    cursor = _staging_conn.cursor()
+    first_id = cursor.execute(
+        "SELECT COALESCE(MAX(rowid), 0) FROM ctags").fetchone()[0]
+    line_count, processed_count = load_api_rows(cursor, path, path.stem)
+    last_id = cursor.execute(
+        "SELECT COALESCE(MAX(rowid), 0) FROM ctags").fetchone()[0]
+    _staging_conn.commit()
 
-                        cursor.execute("""
-                            INSERT INTO ctags (api_file, raw_json)
-                            VALUES (?, ?)
-                        """, (api_name, raw_json))
+    staging_path = cursor.execute("PRAGMA database_list").fetchone()[2]
+    return staging_path, first_id, last_id, line_count, processed_count
 
-                    except json.JSONDecodeError as e:
-                        logger.warning(
-                            f"Failed to parse JSON line {line_count}: {e}")
-                        continue
 
-        update_file_hash(api_name, calculate_file_hash(path), db_path, conn)
+def stage_api_files(paths: List[Path], staging_dir: str) -> Dict[Path, tuple]:
+    """Parse several API files in parallel worker processes.
 
-        conn.commit()
+    Must run before the write transaction is opened, so the database lock is
+    not held while files are parsed. Returns the result of stage_api_file for
+    each path, or an empty dict with fewer than two usable CPUs, in which
+    case the files are indexed serially with index_api_file.
+    """
+    max_workers = min(len(paths), os.cpu_count() or 1, STAGING_WORKERS)
+    if max_workers < 2:
+        return {}
+
+    logger.info(f"Staging {len(paths)} API files in {max_workers} worker processes")
+
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=init_staging_worker,
+                             initargs=(staging_dir,)) as pool:
+        return dict(zip(paths, pool.map(stage_api_file, paths)))
+
+
+def attach_staging_dbs(cursor, staged: Dict[Path, tuple]) -> Dict[str, str]:
+    """Attach the staging databases used by staged, mapping each to its schema.
+
+    ATTACH and DETACH cannot run inside a transaction that uses the
+    databases, so call this before BEGIN and detach_staging_dbs after commit.
+    """
+    schemas = {}
+    for staging_path, *_ in staged.values():
+        if staging_path not in schemas:
+            schemas[staging_path] = f"staging{len(schemas)}"
+            cursor.execute("ATTACH DATABASE ? AS " + schemas[staging_path],
+                           (staging_path,))
+    return schemas
+
+
+def detach_staging_dbs(cursor, schemas: Dict[str, str]):
+    """Detach the databases attached by attach_staging_dbs."""
+    for schema in schemas.values():
+        cursor.execute(f"DETACH DATABASE {schema}")
+
+
+def index_staged_api_file(path: Path, conn, staged_file: tuple, schemas: Dict[str, str],
+                          bulk=False, file_hash: Optional[str] = None,
+                          file_stat: Optional[os.stat_result] = None):
+    """Index an API file from the rows staged for it by stage_api_file.
+
+    The staging database must be attached with attach_staging_dbs. The
+    transaction and the optional hash and stat follow index_api_file.
+    """
+    staging_path, first_id, last_id, line_count, processed_count = staged_file
+    if file_hash is None or file_stat is None:
+        file_stat = path.stat()
+        file_hash = calculate_file_hash(path)
+
+    replace_api_rows(
+        conn, path.stem,
+        lambda cursor: cursor.execute(f"""
+            INSERT INTO ctags (api_file, raw_json, path, kind, line)
+            SELECT api_file, raw_json, path, kind, line
+            FROM {schemas[staging_path]}.ctags
+            WHERE rowid > ? AND rowid <= ?
+        """, (first_id, last_id)),
+        file_hash, file_stat, bulk=bulk)
 
     logger.info(
         f"Indexing complete for {path}. Processed {processed_count} tag entries out of {line_count} total entries")
@@ -205,14 +525,36 @@ def index_apis(apis_dir: Path, db_path=None):
     files_to_index = []
     files_skipped = 0
 
+    stored_states = get_stored_file_states(db_path)
+    file_stats = {api_file: api_file.stat() for api_file in api_files}
+
+    # Only hash files whose mtime or size differ from the last indexing run.
+    files_to_hash = []
     for api_file in api_files:
+        stat = file_stats[api_file]
+        _, stored_mtime, stored_size = stored_states.get(
+            api_file.stem, (None, None, None))
+
+        if stored_mtime == stat.st_mtime_ns and stored_size == stat.st_size:
+            logger.info(f"Skipping {api_file.name} - no changes detected")
+            files_skipped += 1
+        else:
+            files_to_hash.append(api_file)
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+        current_hashes = dict(
+            zip(files_to_hash, pool.map(calculate_file_hash, files_to_hash)))
+
+    files_touched = []
+    for api_file in files_to_hash:
         api_name = api_file.stem
-        current_hash = calculate_file_hash(api_file)
-        stored_hash = get_stored_file_hash(api_name, db_path)
+        current_hash = current_hashes[api_file]
+        stored_hash = stored_states.get(api_name, (None,))[0]
 
         if stored_hash == current_hash:
             logger.info(f"Skipping {api_file.name} - no changes detected")
             files_skipped += 1
+            files_touched.append(api_file)
         else:
             logger.info(f"File {api_file.name} has changed - will reindex")
             files_to_index.append(api_file)
@@ -220,12 +562,60 @@ def index_apis(apis_dir: Path, db_path=None):
     if files_to_index:
         logger.info(
             f"Indexing {len(files_to_index)} changed files (skipped {files_skipped})")
-        for api_file in files_to_index:
-            index_api_file(api_file, db_path)
     else:
         logger.info(
             f"All {len(api_files)} API files are up to date - no indexing needed")
 
+    # Only take the write lock when there is something to write, so an
+    # up-to-date startup does not block on other instances sharing the DB.
+    if files_touched or files_to_index:
+        with tempfile.TemporaryDirectory() as staging_dir:
+            # Parse changed files before connecting, so no database
+            # connection or lock is held while the workers run.
+            staged = stage_api_files(files_to_index, staging_dir)
+
+            with get_db_connection(db_path) as conn:
+                cursor = conn.cursor()
+                schemas = attach_staging_dbs(cursor, staged)
+                try:
+                    # One transaction for the whole pass, so all files commit together.
+                    cursor.execute("BEGIN IMMEDIATE")
+
+                    if files_touched:
+                        # Content is unchanged; record the new mtime/size to skip hashing next time.
+                        cursor.executemany("""
+                            UPDATE indexed_apis SET file_mtime = ?, file_size = ?
+                            WHERE api_name = ?
+                        """, [(file_stats[f].st_mtime_ns, file_stats[f].st_size, f.stem)
+                              for f in files_touched])
+
+                    if files_to_index:
+                        # Rebuild the whole FTS index only when every indexed API is
+                        # being replaced; otherwise update it per API.
+                        bulk = set(stored_states) <= {f.stem for f in files_to_index}
+
+                        drop_fts_triggers(cursor)
+                        for api_file in files_to_index:
+                            if api_file in staged:
+                                index_staged_api_file(api_file, conn, staged[api_file], schemas,
+                                                      bulk=bulk,
+                                                      file_hash=current_hashes[api_file],
+                                                      file_stat=file_stats[api_file])
+                            else:
+                                index_api_file(api_file, db_path, conn, bulk=bulk,
+                                               file_hash=current_hashes[api_file],
+                                               file_stat=file_stats[api_file])
+                        if bulk:
+                            rebuild_fts_index(cursor)
+                        else:
+                            create_fts_triggers(cursor)
+
+                    conn.commit()
+                finally:
+                    # Ends the transaction if it failed; DETACH is refused inside one.
+                    conn.rollback()
+                    detach_staging_dbs(cursor, schemas)
+
     with get_db_connection(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM ctags")
@@ -254,13 +644,34 @@ def search_declarations(name: str, offset: int = 0, limit: int = 10) -> dict:
     """
     logger.info(f"Declaration search requested for: '{name}' (offset={offset}, limit={limit})")
 
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    # data_version changes whenever another connection, in this or any other
+    # process, commits to the database, which invalidates cached results.
+    with SERVER_CONN_LOCK:
+        cursor = get_server_connection().cursor()
+        cursor.execute("PRAGMA data_version")
+        data_version = cursor.fetchone()[0]
+
+    total_count, raw_matches = _search_declarations(data_version, name, offset, limit)
+    matches = [_jloads(raw_json) for raw_json in raw_matches]
+
+    logger.info(f"Found {total_count} total matches for '{name}', returning {len(matches)}")
+    return {
+        "matches": matches,
+        "count": total_count,
+        "offset": offset,
+        "limit": limit
+    }
+
+
+@lru_cache(maxsize=SEARCH_CACHE_SIZE)
+def _search_declarations(data_version: int, name: str, offset: int, limit: int) -> Tuple[int, Tuple[str, ...]]:
+    """Return the match count and raw JSON of a page of matches; cached per data_version."""
+    with SERVER_CONN_LOCK:
+        cursor = get_server_connection().cursor()
 
         cursor.execute("""
             SELECT COUNT(*)
-            FROM ctags c
-            INNER JOIN ctags_fts fts ON c.id = fts.rowid
+            FROM ctags_fts
             WHERE ctags_fts MATCH ?
         """, (name,))
 
@@ -269,21 +680,16 @@ def search_declarations(name: str, offset: int = 0, limit: int = 10) -> dict:
         cursor.execute("""
             SELECT c.raw_json
             FROM ctags c
-            INNER JOIN ctags_fts fts ON c.id = fts.rowid
-            WHERE ctags_fts MATCH ?
-            LIMIT ? OFFSET ?
+            WHERE c.id IN (
+                SELECT rowid
+                FROM ctags_fts
+                WHERE ctags_fts MATCH ?
+                LIMIT ? OFFSET ?
+            )
         """, (name, limit, offset))
 
         rows = cursor.fetchall()
-        matches = [json.loads(row[0]) for row in rows]
-
-        logger.info(f"Found {total_count} total matches for '{name}', returning {len(matches)}")
-        return {
-            "matches": matches,
-            "count": total_count,
-            "offset": offset,
-            "limit": limit
-        }
+        return total_count, tuple(row[0] for row in rows)
 
 
 @SERVER.tool()
@@ -298,8 +704,8 @@ def list_indexed_apis() -> dict:
     """
     logger.info("Listing indexed APIs requested")
 
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    with SERVER_CONN_LOCK:
+        cursor = get_server_connection().cursor()
         cursor.execute("SELECT api_name FROM indexed_apis ORDER BY indexed_at")
         rows = cursor.fetchall()
 
@@ -329,21 +735,21 @@ def list_api_files(api_name: str, offset: int = 0, limit: int = 100) -> dict:
     logger.info(
         f"Listing files for API: '{api_name}' (offset={offset}, limit={limit})")
 
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    with SERVER_CONN_LOCK:
+        cursor = get_server_connection().cursor()
 
         cursor.execute("""
-            SELECT COUNT(DISTINCT json_extract(raw_json, '$.path'))
+            SELECT COUNT(DISTINCT path)
             FROM ctags
-            WHERE api_file = ? AND json_extract(raw_json, '$.path') IS NOT NULL
+            WHERE api_file = ? AND path IS NOT NULL
         """, (api_name,))
 
         total_count = cursor.fetchone()[0]
 
         cursor.execute("""
-            SELECT DISTINCT json_extract(raw_json, '$.path') as file_path
+            SELECT DISTINCT path as file_path
             FROM ctags
-            WHERE api_file = ? AND json_extract(raw_json, '$.path') IS NOT NULL
+            WHERE api_file = ? AND path IS NOT NULL
             ORDER BY file_path
             LIMIT ? OFFSET ?
         """, (api_name, limit, offset))
@@ -379,14 +785,14 @@ def list_functions_by_file(file_path: str, offset: int = 0, limit: int = 100) ->
     logger.info(
         f"Listing functions for file: '{file_path}' (offset={offset}, limit={limit})")
 
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    with SERVER_CONN_LOCK:
+        cursor = get_server_connection().cursor()
 
         cursor.execute("""
             SELECT COUNT(*)
             FROM ctags
-            WHERE json_extract(raw_json, '$.path') = ?
-            AND json_extract(raw_json, '$.kind') IN ('function', 'prototype', 'func')
+            WHERE path = ?
+            AND kind IN ('function', 'prototype', 'func')
         """, (file_path,))
 
         total_count = cursor.fetchone()[0]
@@ -394,9 +800,9 @@ def list_functions_by_file(file_path: str, offset: int = 0, limit: int = 100) ->
         cursor.execute("""
             SELECT json_extract(raw_json, '$.name')
             FROM ctags
-            WHERE json_extract(raw_json, '$.path') = ?
-            AND json_extract(raw_json, '$.kind') IN ('function', 'prototype', 'func')
-            ORDER BY json_extract(raw_json, '$.line')
+            WHERE path = ?
+            AND kind IN ('function', 'prototype', 'func')
+            ORDER BY line
             LIMIT ? OFFSET ?
         """, (file_path, limit, offset))
 
@@ -430,12 +836,15 @@ def get_gitignore_excludes(directory: Path) -> Set[str]:
         logger.warning(f"Failed to read .gitignore: {e}")
         return excludes
 
-    for item in os.listdir(directory):
-        item_path = directory / item
-        for pattern in patterns:
-            if fnmatch.fnmatch(item, pattern):
-                excludes.add(str(item_path))
-                break
+    if not patterns:
+        return excludes
+
+    combined = re.compile("|".join(fnmatch.translate(p) for p in patterns))
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if combined.match(entry.name):
+                excludes.add(entry.path)
 
     return excludes
 
@@ -482,7 +891,7 @@ def generate_ctags(include_directory: str) -> dict:
             "--fields=+Sf",
             "--kinds-C=+p",
             "-R",
-            "-f", str(output_file),
+            "-f", "-",
         ]
 
         excludes = get_gitignore_excludes(include_path)
@@ -492,9 +901,58 @@ def generate_ctags(include_directory: str) -> dict:
         cmd.append(str(include_path))
 
         logger.info(f"Running command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
-            index_api_file(output_file)
+
+        # Write ctags output to a temporary file, hashing it on the way. The
+        # index is only updated if ctags succeeds, and the file is only
+        # replaced once the index update has committed.
+        api_name = output_file.stem
+        partial_file = output_file.with_name(output_file.name + ".tmp")
+        file_hash = hashlib.sha256()
+
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+
+            try:
+                with proc.stdout, open(partial_file, "wb") as out:
+                    for chunk in iter(lambda: proc.stdout.read(HASH_CHUNK_SIZE), b""):
+                        out.write(chunk)
+                        file_hash.update(chunk)
+                returncode = proc.wait()
+
+                if returncode == 0:
+                    # The rename below keeps the mtime and size recorded here.
+                    stat = partial_file.stat()
+
+                    try:
+                        with get_db_connection() as conn:
+                            cursor = conn.cursor()
+                            cursor.execute("BEGIN IMMEDIATE")
+                            drop_fts_triggers(cursor)
+                            line_count, processed_count = replace_api_rows(
+                                conn, api_name,
+                                lambda cursor: load_api_rows(cursor, partial_file, api_name),
+                                file_hash.hexdigest(), stat)
+                            create_fts_triggers(cursor)
+                            conn.commit()
+                    except sqlite3.OperationalError as e:
+                        error_msg = f"Failed to index ctags output: {str(e)}"
+                        logger.error(error_msg)
+                        return {"success": False, "error": error_msg}
+
+                    os.replace(partial_file, output_file)
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+                partial_file.unlink(missing_ok=True)
+
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode("utf-8", errors="replace")
+
+        if returncode == 0:
+            logger.info(
+                f"Indexing complete for {output_file}. Processed {processed_count} tag entries out of {line_count} total entries")
             logger.info(
                 f"ctags generation and indexing complete: {output_file}")
             return {
@@ -503,11 +961,9 @@ def generate_ctags(include_directory: str) -> dict:
                 "message": "ctags generation and indexing complete"
             }
         else:
-            logger.error(f"ctags failed with return code {result.returncode}")
-            if result.stderr:
-                logger.error(f"ctags stderr: {result.stderr}")
-            if result.stdout:
-                logger.error(f"ctags stdout: {result.stdout}")
+            logger.error(f"ctags failed with return code {returncode}")
+            if stderr:
+                logger.error(f"ctags stderr: {stderr}")
             return {
                 "success": False,
                 "error": "ctags generation failed",
@@ -1,8 +1,11 @@
+import sqlite3
 import tempfile
 import unittest
 import os
 from pathlib import Path
-from main import generate_ctags, init_database, search_declarations, list_indexed_apis, list_api_files, list_functions_by_file
+from unittest import mock
+import main
+from main import generate_ctags, init_database, index_apis, search_declarations, list_indexed_apis, list_api_files, list_functions_by_file
 
 
 class TestApiLookUpMCPServer(unittest.TestCase):
@@ -194,6 +197,389 @@ class TestApiLookUpMCPServer(unittest.TestCase):
             finally:
                 os.chdir(Path(__file__).parent)
 
+    def test_index_apis_multiple_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            init_database()
+
+            apis_dir = temp_path / "apis"
+            apis_dir.mkdir()
+
+            (apis_dir / "first.ctags").write_text(
+                '{"_type": "ptag", "name": "JSON_OUTPUT_VERSION"}\n'
+                '{"_type": "tag", "name": "first_function", "path": "/first/a.h", "kind": "prototype", "line": 1}\n'
+                '{"_type": "tag", "name": "first_other", "path": "/first/a.h", "kind": "prototype", "line": 2}\n'
+            )
+            (apis_dir / "second.ctags").write_text(
+                '{"_type": "tag", "name": "second_function", "path": "/second/b.h", "kind": "prototype", "line": 1}\n'
+                'not json\n'
+            )
+
+            try:
+                index_apis(apis_dir)
+
+                self.assertEqual(list_indexed_apis()["count"], 2)
+                self.assertEqual(search_declarations("first_function")["count"], 1)
+                self.assertEqual(search_declarations("second_function")["count"], 1)
+                self.assertEqual(
+                    list_functions_by_file("/first/a.h")["functions"],
+                    ["first_function", "first_other"])
+
+                (apis_dir / "second.ctags").write_text(
+                    '{"_type": "tag", "name": "second_renamed", "path": "/second/b.h", "kind": "prototype", "line": 1}\n'
+                )
+                index_apis(apis_dir)
+
+                self.assertEqual(search_declarations("second_function")["count"], 0)
+                self.assertEqual(search_declarations("second_renamed")["count"], 1)
+                self.assertEqual(search_declarations("first_function")["count"], 1)
+
+            except Exception as e:
+                self.fail(f"index_apis raised an exception: {str(e)}")
+            finally:
+                os.chdir(Path(__file__).parent)
+
+    def test_index_apis_parallel_staging(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            init_database()
+
+            apis_dir = temp_path / "apis"
+            apis_dir.mkdir()
+
+            for name in ("one", "two", "three"):
+                (apis_dir / f"{name}.ctags").write_text(
+                    f'{{"_type": "tag", "name": "{name}_function", "path": "/{name}/a.h", "kind": "prototype", "line": 2}}\n'
+                    f'{{"_type": "tag", "name": "{name}_first", "path": "/{name}/a.h", "kind": "function", "line": 1}}\n'
+                )
+
+            try:
+                # Report several CPUs so the files are staged by worker processes.
+                with mock.patch("main.os.cpu_count", return_value=4), \
+                        mock.patch("main.index_api_file", wraps=main.index_api_file) as index_api_file:
+                    index_apis(apis_dir)
+
+                    self.assertEqual(index_api_file.call_count, 0)
+                    self.assertEqual(list_indexed_apis()["count"], 3)
+                    self.assertEqual(search_declarations("two_function")["count"], 1)
+                    self.assertEqual(
+                        list_functions_by_file("/three/a.h")["functions"],
+                        ["three_first", "three_function"])
+
+                    (apis_dir / "one.ctags").write_text(
+                        '{"_type": "tag", "name": "one_renamed", "path": "/one/a.h", "kind": "prototype", "line": 1}\n'
+                    )
+                    (apis_dir / "two.ctags").write_text(
+                        '{"_type": "tag", "name": "two_renamed", "path": "/two/a.h", "kind": "prototype", "line": 1}\n'
+                    )
+                    index_apis(apis_dir)
+
+                    self.assertEqual(index_api_file.call_count, 0)
+                    self.assertEqual(search_declarations("one_function")["count"], 0)
+                    self.assertEqual(search_declarations("one_renamed")["count"], 1)
+                    self.assertEqual(search_declarations("two_renamed")["count"], 1)
+                    self.assertEqual(search_declarations("three_function")["count"], 1)
+
+                conn = sqlite3.connect("ctags_index.db")
+                conn.execute("INSERT INTO ctags_fts(ctags_fts) VALUES('integrity-check')")
+                conn.close()
+
+            except Exception as e:
+                self.fail(f"parallel staging test failed: {str(e)}")
+            finally:
+                os.chdir(Path(__file__).parent)
+
+    def test_index_api_file_standalone(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            init_database()
+
+            api_file = temp_path / "single.ctags"
+            api_file.write_text(
+                '{"_type": "tag", "name": "single_function", "path": "/single/a.h", "kind": "prototype", "line": 1}\n'
+            )
+
+            try:
+                main.index_api_file(api_file)
+
+                self.assertEqual(list_indexed_apis()["indexed_apis"], ["single"])
+                self.assertEqual(search_declarations("single_function")["count"], 1)
+
+                api_file.write_text(
+                    '{"_type": "tag", "name": "single_renamed", "path": "/single/a.h", "kind": "prototype", "line": 1}\n'
+                )
+                main.index_api_file(api_file)
+
+                self.assertEqual(search_declarations("single_function")["count"], 0)
+                self.assertEqual(search_declarations("single_renamed")["count"], 1)
+                self.assertEqual(
+                    main.get_stored_file_states()["single"][0],
+                    main.calculate_file_hash(api_file))
+
+            except Exception as e:
+                self.fail(f"index_api_file raised an exception: {str(e)}")
+            finally:
+                os.chdir(Path(__file__).parent)
+
+    def test_generate_ctags_failure_keeps_previous_index(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            init_database()
+
+            include_dir = temp_path / "mylib"
+            include_dir.mkdir()
+            (include_dir / "mylib.h").write_text("int kept_function(void);")
+
+            apis_dir = temp_path / "apis"
+            apis_dir.mkdir()
+            ctags_content = (
+                '{"_type": "tag", "name": "kept_function", "path": "/mylib/mylib.h", "kind": "prototype", "line": 1}\n'
+            )
+            ctags_file = apis_dir / "mylib.ctags"
+            ctags_file.write_text(ctags_content)
+
+            bin_dir = temp_path / "bin"
+            bin_dir.mkdir()
+            failing_ctags = bin_dir / "ctags"
+            failing_ctags.write_text(
+                "#!/bin/sh\n"
+                "echo '{\"_type\": \"tag\", \"name\": \"partial_function\", \"path\": \"/mylib/mylib.h\", \"kind\": \"prototype\", \"line\": 1}'\n"
+                "echo 'ctags exploded' >&2\n"
+                "exit 1\n"
+            )
+            failing_ctags.chmod(0o755)
+
+            original_path = os.environ["PATH"]
+            os.environ["PATH"] = f"{bin_dir}{os.pathsep}{original_path}"
+
+            try:
+                index_apis(apis_dir)
+
+                with self.assertLogs("main", level="ERROR") as logs:
+                    result = generate_ctags(str(include_dir))
+
+                self.assertFalse(result["success"])
+                self.assertEqual(result["error"], "ctags generation failed")
+                self.assertTrue(
+                    any("ctags exploded" in line for line in logs.output))
+
+                self.assertEqual(ctags_file.read_text(), ctags_content)
+                self.assertEqual(os.listdir(apis_dir), ["mylib.ctags"])
+
+                self.assertEqual(search_declarations("kept_function")["count"], 1)
+                self.assertEqual(search_declarations("partial_function")["count"], 0)
+                self.assertEqual(list_indexed_apis()["indexed_apis"], ["mylib"])
+
+            except Exception as e:
+                self.fail(f"generate_ctags failure test failed: {str(e)}")
+            finally:
+                os.environ["PATH"] = original_path
+                os.chdir(Path(__file__).parent)
+
+    def test_generate_ctags_locked_database_keeps_previous_file(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            init_database()
+
+            include_dir = temp_path / "mylib"
+            include_dir.mkdir()
+            (include_dir / "mylib.h").write_text("int new_function(void);")
+
+            apis_dir = temp_path / "apis"
+            apis_dir.mkdir()
+            ctags_content = (
+                '{"_type": "tag", "name": "kept_function", "path": "/mylib/mylib.h", "kind": "prototype", "line": 1}\n'
+            )
+            ctags_file = apis_dir / "mylib.ctags"
+            ctags_file.write_text(ctags_content)
+
+            bin_dir = temp_path / "bin"
+            bin_dir.mkdir()
+            fake_ctags = bin_dir / "ctags"
+            fake_ctags.write_text(
+                "#!/bin/sh\n"
+                "echo '{\"_type\": \"tag\", \"name\": \"new_function\", \"path\": \"/mylib/mylib.h\", \"kind\": \"prototype\", \"line\": 1}'\n"
+            )
+            fake_ctags.chmod(0o755)
+
+            original_path = os.environ["PATH"]
+            os.environ["PATH"] = f"{bin_dir}{os.pathsep}{original_path}"
+
+            try:
+                index_apis(apis_dir)
+
+                with mock.patch("main.replace_api_rows",
+                                side_effect=sqlite3.OperationalError("database is locked")):
+                    result = generate_ctags(str(include_dir))
+
+                self.assertFalse(result["success"])
+                self.assertIn("database is locked", result["error"])
+
+                self.assertEqual(ctags_file.read_text(), ctags_content)
+                self.assertEqual(os.listdir(apis_dir), ["mylib.ctags"])
+                self.assertEqual(search_declarations("kept_function")["count"], 1)
+                self.assertEqual(search_declarations("new_function")["count"], 0)
+
+                result = generate_ctags(str(include_dir))
+
+                self.assertTrue(result["success"])
+                self.assertIn("new_function", ctags_file.read_text())
+                self.assertEqual(os.listdir(apis_dir), ["mylib.ctags"])
+                self.assertEqual(search_declarations("new_function")["count"], 1)
+                self.assertEqual(search_declarations("kept_function")["count"], 0)
+                self.assertEqual(
+                    main.get_stored_file_states()["mylib"][0],
+                    main.calculate_file_hash(ctags_file))
+
+            except Exception as e:
+                self.fail(f"generate_ctags locked database test failed: {str(e)}")
+            finally:
+                os.environ["PATH"] = original_path
+                os.chdir(Path(__file__).parent)
+
+    def test_index_apis_skips_touched_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            init_database()
+
+            apis_dir = temp_path / "apis"
+            apis_dir.mkdir()
+
+            api_file = apis_dir / "touched.ctags"
+            api_file.write_text(
+                '{"_type": "tag", "name": "touched_function", "path": "/touched/a.h", "kind": "prototype", "line": 1}\n'
+            )
+
+            try:
+                index_apis(apis_dir)
+
+                stat = api_file.stat()
+                os.utime(api_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+                with mock.patch("main.calculate_file_hash",
+                                wraps=main.calculate_file_hash) as hash_spy:
+                    index_apis(apis_dir)
+                    self.assertEqual(hash_spy.call_count, 1)
+
+                    hash_spy.reset_mock()
+                    index_apis(apis_dir)
+                    self.assertEqual(hash_spy.call_count, 0)
+
+                self.assertEqual(search_declarations("touched_function")["count"], 1)
+
+            except Exception as e:
+                self.fail(f"touched file test failed: {str(e)}")
+            finally:
+                os.chdir(Path(__file__).parent)
+
+    def test_init_database_upgrades_indexed_apis(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir)
+
+            os.chdir(temp_dir)
+
+            conn = sqlite3.connect("ctags_index.db")
+            conn.execute("""
+                CREATE TABLE indexed_apis (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    api_name TEXT UNIQUE NOT NULL,
+                    file_hash TEXT,
+                    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.commit()
+            conn.close()
+
+            apis_dir = temp_path / "apis"
+            apis_dir.mkdir()
+            (apis_dir / "legacy.ctags").write_text(
+                '{"_type": "tag", "name": "legacy_function", "path": "/legacy/a.h", "kind": "prototype", "line": 1}\n'
+            )
+
+            try:
+                init_database()
+
+                conn = sqlite3.connect("ctags_index.db")
+                columns = {row[1] for row in conn.execute(
+                    "PRAGMA table_info(indexed_apis)")}
+                conn.close()
+                self.assertIn("file_mtime", columns)
+                self.assertIn("file_size", columns)
+
+                index_apis(apis_dir)
+
+                self.assertEqual(list_indexed_apis()["indexed_apis"], ["legacy"])
+                self.assertEqual(search_declarations("legacy_function")["count"], 1)
+
+            except Exception as e:
+                self.fail(f"indexed_apis upgrade test failed: {str(e)}")
+            finally:
+                os.chdir(Path(__file__).parent)
+
+    def test_init_database_upgrades_ctags_columns(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            os.chdir(temp_dir)
+
+            conn = sqlite3.connect("ctags_index.db")
+            conn.execute("""
+                CREATE TABLE ctags (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    api_file TEXT NOT NULL,
+                    raw_json TEXT NOT NULL,
+                    indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX idx_path_kind_line ON ctags(
+                    json_extract(raw_json, '$.path'),
+                    json_extract(raw_json, '$.kind'),
+                    json_extract(raw_json, '$.line')
+                )
+            """)
+            conn.executemany("INSERT INTO ctags (api_file, raw_json) VALUES (?, ?)", [
+                ("legacy", '{"_type": "tag", "name": "second", "path": "/legacy/a.h", "kind": "prototype", "line": 20}'),
+                ("legacy", '{"_type": "tag", "name": "first", "path": "/legacy/a.h", "kind": "function", "line": 10}'),
+            ])
+            conn.commit()
+            conn.close()
+
+            try:
+                init_database()
+
+                conn = sqlite3.connect("ctags_index.db")
+                indexes = {row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index'")}
+                conn.close()
+                self.assertNotIn("idx_path_kind_line", indexes)
+                self.assertIn("idx_ctags_path_kind_line", indexes)
+
+                result = list_functions_by_file("/legacy/a.h")
+                self.assertEqual(result["functions"], ["first", "second"])
+                self.assertEqual(list_api_files("legacy")["files"], ["/legacy/a.h"])
+
+            except Exception as e:
+                self.fail(f"ctags columns upgrade test failed: {str(e)}")
+            finally:
+                os.chdir(Path(__file__).parent)
+
 
 if __name__ == "__main__":
     unittest.main()